@@ -1,10 +1,15 @@
-from pdf2image import convert_from_bytes
 from PIL import Image
 from bs4 import BeautifulSoup
 from pptx.enum.shapes import PP_PLACEHOLDER_TYPE
 from pptx import Presentation
 from pptx.shapes.base import _PlaceholderFormat
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 import subprocess
+import threading
+import shutil
+import math
+import signal
+import time
 import base64
 import io
 import tempfile
@@ -13,6 +18,122 @@ import pathlib
 import zipfile
 from pathlib import Path
 
+# Limits for external converters (seconds and megabytes), can be overridden by environment variables
+SOFFICE_TIMEOUT = float(os.environ.get("SOFFICE_TIMEOUT", 120))
+PANDOC_TIMEOUT = float(os.environ.get("PANDOC_TIMEOUT", 30))
+POPPLER_TIMEOUT = float(os.environ.get("POPPLER_TIMEOUT", 60))
+CONVERTER_MEMORY_LIMIT = int(os.environ.get("CONVERTER_MEMORY_LIMIT", 4096))
+# Number of pdftoppm processes rendering parts of one pdf in parallel
+POPPLER_PROCESSES = int(os.environ.get("POPPLER_PROCESSES", os.cpu_count() or 1))
+# How often a running converter is checked for timeout and cancellation
+POLL_INTERVAL = 0.1
+
+
+class ConversionError(Exception):
+    '''
+    Base exception for failures of external converters
+    '''
+
+
+class ConversionTimeout(ConversionError):
+    '''
+    External converter did not finish in the allotted time
+    '''
+
+
+class ConversionCancelled(ConversionError):
+    '''
+    Conversion was cancelled by the user
+    '''
+
+
+def limit_resources(args: list, timeout: float) -> list:
+    '''
+    Prefix the command with prlimit, so CPU and memory limits are set before the converter starts
+
+    Parameters
+    ----------
+        args: list
+            Command and its arguments
+        timeout: float
+            Timeout of the stage, CPU time of every process is limited by it
+    '''
+    # The timeout is enforced by the parent, the CPU limit is enforced by the kernel and still stops
+    # the converter if the parent is gone (e.g. the server was killed) and can't kill the group
+    cpu = math.ceil(timeout)
+    memory = CONVERTER_MEMORY_LIMIT * 1024 * 1024
+    # prlimit execs the converter in place, so it keeps the pid and stays the leader of the process group
+    return ["prlimit", f"--cpu={cpu}", f"--as={memory}", "--", *args]
+
+
+def kill_process_group(process: subprocess.Popen):
+    '''
+    Kill the whole process group of the converter, including orphaned children (e.g. soffice.bin)
+
+    Parameters
+    ----------
+        process: subprocess.Popen
+            Leader of the process group
+    '''
+    # The leader isn't reaped yet and holds its pid, so the group id can't be reused by another
+    # converter started in a parallel thread, and only our own processes get the signal
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+def run_process(args: list, timeout: float, cancel_event: threading.Event | None = None, stdout=None):
+    '''
+    Run an external converter with a timeout, resource limits and cancellation support
+
+    Parameters
+    ----------
+        args: list
+            Command and its arguments
+        timeout: float
+            Maximum running time in seconds
+        cancel_event: threading.Event | None
+            If set, the converter is stopped and ConversionCancelled is raised
+        stdout: file object | None
+            File for the output of the converter, by default the output isn't redirected
+    Raises
+    ------
+        ConversionError
+            The converter or prlimit is not installed
+        ConversionTimeout
+            The converter did not finish in time
+        ConversionCancelled
+            The conversion was cancelled
+        subprocess.CalledProcessError
+            The converter exited with a non-zero code
+    '''
+    if cancel_event is not None and cancel_event.is_set():
+        raise ConversionCancelled(f"Conversion was cancelled before running {args[0]}")
+    # Otherwise a missing converter would be reported by prlimit as an exit code 127
+    for command in ("prlimit", args[0]):
+        if shutil.which(command) is None:
+            raise ConversionError(f"{command} is not installed")
+
+    # New session makes the converter a leader of its own process group, so it can be killed with all children
+    process = subprocess.Popen(limit_resources(args, timeout), start_new_session=True, stdout=stdout)
+    deadline = time.monotonic() + timeout
+    try:
+        # WNOWAIT leaves the finished leader unreaped, so it isn't reaped before its group is killed
+        while os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ConversionCancelled(f"Conversion was cancelled while running {args[0]}")
+            if time.monotonic() >= deadline:
+                raise ConversionTimeout(f"{args[0]} did not finish in {timeout:g} seconds")
+            time.sleep(POLL_INTERVAL)
+    finally:
+        # Children may outlive the leader even on success, so the group is always killed
+        kill_process_group(process)
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args)
+
 
 class GenImage():
     '''
@@ -26,6 +147,8 @@ class GenImage():
         Storage of standard fonts for the theme
     fonts: Dict[str, list]
         A dictionary for fonts from slides. The key is the slide number, and the value is the font list.
+    cancel_event: threading.Event | None
+        Event for cancelling the conversion from another thread
     
     Methods
     -------
@@ -41,13 +164,14 @@ class GenImage():
         Get base64 bytes from buffer
 
     '''
-    def __init__(self, bytes: bytes, file_format: str):
+    def __init__(self, bytes: bytes, file_format: str, cancel_event: threading.Event | None = None):
         '''
         Creates an image from the resulting byte array
         '''
         self.buffer = io.BytesIO()
         self.default_fonts = {}
         self.fonts = {}
+        self.cancel_event = cancel_event
         # Automatically calling the converter, if the type is not supported, we throw an exception
         converter = getattr(self, file_format.lower(), lambda bytes: self.not_support(file_format))
         converter(bytes)
@@ -148,14 +272,14 @@ class GenImage():
             self.parse_fonts_on_slide(pptx_path)
 
             # Run libreoffice for convert pptx to pdf
-            subprocess.run([
+            run_process([
                 "soffice",
                 "--headless",
                 f"-env:UserInstallation={tmpdir_path.as_uri()}",
                 "--convert-to", "pdf",
                 "--outdir", tmpdir,
                 pptx_path
-            ], check=True)
+            ], SOFFICE_TIMEOUT, self.cancel_event)
 
             os.remove(pptx_path)
 
@@ -177,8 +301,26 @@ class GenImage():
             pdf_bytes: bytes
                 An array of bytes that may contain a pdf
         '''
-        images = convert_from_bytes(pdf_bytes, thread_count=100)
-        images = [image.resize((1440, 900)) for image in images]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir_path = pathlib.Path(tmpdir)
+            pdf_path = tmpdir_path.joinpath("presentation.pdf")
+            info_path = tmpdir_path.joinpath("info.txt")
+
+            with open(pdf_path, "wb") as f:
+                f.write(pdf_bytes)
+
+            # All poppler runs share one deadline
+            deadline = time.monotonic() + POPPLER_TIMEOUT
+            with open(info_path, "w") as f:
+                run_process(["pdfinfo", pdf_path], POPPLER_TIMEOUT, self.cancel_event, stdout=f)
+            with open(info_path) as f:
+                pages = next(int(line.split()[1]) for line in f if line.startswith("Pages:"))
+
+            self.render_pages(pdf_path, tmpdir_path.joinpath("slide"), pages, deadline)
+
+            # Page numbers are zero-padded to the width of the last page number, so sorting by name keeps the slides order
+            # Images are loaded before the temporary directory is removed
+            images = [Image.open(path).convert("RGB") for path in sorted(tmpdir_path.glob("slide-*.ppm"))]
         max_width = max([img.width for img in images])
         max_height = max([img.height for img in images])
         # Create empty image for pasting
@@ -190,6 +332,49 @@ class GenImage():
             x_offset += img.width
         self.img.save(self.buffer, "jpeg")
 
+    def render_pages(self, pdf_path, output_prefix, pages: int, deadline: float):
+        '''
+        Render pages of pdf to ppm images, page ranges are rendered by several pdftoppm processes in parallel
+
+        Parameters
+        ----------
+            pdf_path: str
+                Path to pdf file
+            output_prefix: str
+                Prefix of paths of rendered pages
+            pages: int
+                Number of pages in pdf
+            deadline: float
+                Time by monotonic clock when rendering must be finished
+        '''
+        if pages == 0:
+            return
+        processes = max(1, min(POPPLER_PROCESSES, pages))
+        chunk = math.ceil(pages / processes)
+        ranges = [(first, min(first + chunk - 1, pages)) for first in range(1, pages + 1, chunk)]
+        # Stops the remaining renders after the first failure or cancellation
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            # Pages are rendered right in the final size
+            futures = {executor.submit(run_process, [
+                "pdftoppm",
+                "-f", str(first),
+                "-l", str(last),
+                "-scale-to-x", "1440",
+                "-scale-to-y", "900",
+                pdf_path,
+                output_prefix
+            ], deadline - time.monotonic(), stop) for first, last in ranges}
+            try:
+                while futures:
+                    done, futures = wait(futures, timeout=POLL_INTERVAL, return_when=FIRST_EXCEPTION)
+                    for future in done:
+                        future.result()
+                    if self.cancel_event is not None and self.cancel_event.is_set():
+                        raise ConversionCancelled("Conversion was cancelled while running pdftoppm")
+            finally:
+                stop.set()
+
     def base64(self):
         '''
         Get base64 bytes from buffer
@@ -198,7 +383,7 @@ class GenImage():
 
 
 # For future changes towards safe conversion
-def convert_to_img(file: bytes, format: str) -> GenImage:
+def convert_to_img(file: bytes, format: str, cancel_event: threading.Event | None = None) -> GenImage:
     '''
     Function of converting a presentation into an image
 
@@ -208,11 +393,13 @@ def convert_to_img(file: bytes, format: str) -> GenImage:
             file to be converted, in bytes
         format: str
             format/type of file that needs to be converted
+        cancel_event: threading.Event | None
+            event for cancelling the conversion from another thread
     '''
-    return GenImage(file, format)
+    return GenImage(file, format, cancel_event)
 
 
-def response_handler(response):
+def response_handler(response, cancel_event=None):
     """
     Handle LLM response, convert Markdown to DOCX and PDF.
 
@@ -220,6 +407,8 @@ def response_handler(response):
     ----------
         response: str
             String received from LLM as response
+        cancel_event: threading.Event | None
+            Event for cancelling the conversion from another thread
     Returns
     -------
         tuple[bytes, bytes]
@@ -234,20 +423,20 @@ def response_handler(response):
         # Create output DOCX path
         docx_path = temp_path / "output.docx"
         # Run pandoc conversion to DOCX
-        subprocess.run(["pandoc", str(md_path), "-o", str(docx_path)], check=True)
+        run_process(["pandoc", str(md_path), "-o", str(docx_path)], PANDOC_TIMEOUT, cancel_event)
         # Read DOCX content
         with open(docx_path, "rb") as f:
             docx_bytes = f.read()
         # Convert DOCX to PDF
         pdf_path = temp_path / "output.pdf"
-        subprocess.run([
+        run_process([
             "soffice",
             "--headless",
             f"-env:UserInstallation={temp_path.as_uri()}",
             "--convert-to", "pdf",
             "--outdir", str(temp_dir),
             str(docx_path)
-        ], check=True)
+        ], SOFFICE_TIMEOUT, cancel_event)
         # Read PDF content
         with open(pdf_path, "rb") as f:
             pdf_bytes = f.read()
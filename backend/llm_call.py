@@ -1,9 +1,16 @@
 import os
-from openai import OpenAI
-from .converter import convert_to_img
+import httpx
+from openai import OpenAI, APITimeoutError
+from .converter import convert_to_img, ConversionCancelled
 
+# Limits of requests to llm, can be overridden by environment variables
+# Timeout in seconds, for a streamed answer it limits the wait for every next chunk
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 180))
+# Every retry of a timed out request holds the evaluation worker for one more timeout
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 0))
 
-def send_request(prompt, presentation, file_format, model="meta-llama/llama-4-maverick:free"):
+
+def send_request(prompt, presentation, file_format, model="meta-llama/llama-4-maverick:free", cancel_event=None):
     """
     Send a request to OpenAI based on received params
 
@@ -17,16 +24,19 @@ def send_request(prompt, presentation, file_format, model="meta-llama/llama-4-ma
             format of the uploaded presentation pdf or pptx
         model: str
             chosen by user llm default llama-4-maverick
+        cancel_event: threading.Event | None
+            event for cancelling the evaluation from another thread
     Returns
         ----------
-        json
-            report in json format, contains structure, content evaluation and correction advices
+        str
+            report text, contains structure, content evaluation and correction advices
     """
     # get OPENAI_API_KEY from env variables
     api_key = os.environ["OPENAI_API_KEY"]
-    client = OpenAI(api_key=api_key, base_url="https://openrouter.ai/api/v1")
+    client = OpenAI(api_key=api_key, base_url="https://openrouter.ai/api/v1", timeout=LLM_TIMEOUT,
+                    max_retries=LLM_MAX_RETRIES)
     # process and decode presentation
-    converted_presentation = convert_to_img(presentation, file_format)
+    converted_presentation = convert_to_img(presentation, file_format, cancel_event)
     image = converted_presentation.base64().decode()
     # get information about fonts on each slide (for pptx format only)
     if len(converted_presentation.fonts) > 0:
@@ -40,12 +50,28 @@ def send_request(prompt, presentation, file_format, model="meta-llama/llama-4-ma
             "url": f"data:image/jpeg;base64,{image}"
         }
     }]
-    response = client.chat.completions.create(
+    # don't waste a request to llm if evaluation was cancelled during conversion
+    if cancel_event is not None and cancel_event.is_set():
+        raise ConversionCancelled("Evaluation was cancelled before sending the request")
+    # answer is streamed, so the evaluation can be cancelled between chunks
+    text = []
+    with client.chat.completions.create(
         model=model,
         messages=[{
             "role": "user",
             "content": content
-        }]
-    )
+        }],
+        stream=True
+    ) as stream:
+        try:
+            for chunk in stream:
+                # leaving the block closes the connection, so llm stops generating the answer
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ConversionCancelled("Evaluation was cancelled while waiting for the answer")
+                if chunk.choices and chunk.choices[0].delta.content:
+                    text.append(chunk.choices[0].delta.content)
+        # timeout while reading the stream isn't wrapped by openai, unlike timeout of the request
+        except httpx.TimeoutException as e:
+            raise APITimeoutError(request=e.request) from e
 
-    return response
+    return "".join(text)
@@ -18,6 +18,8 @@ def main():
         st.session_state["pdf_bytes"] = None
     if "name" not in st.session_state:
         st.session_state["name"] = None
+    if "evaluation" not in st.session_state:
+        st.session_state["evaluation"] = None
 
     # creates two active tabs
     tab1, tab2 = st.tabs(["Загрузка", "Текст запроса"])
@@ -1,7 +1,11 @@
 import streamlit as st
 from streamlit_theme import st_theme
 from backend.llm_call import send_request
-from backend.converter import response_handler
+from backend.converter import response_handler, ConversionCancelled, ConversionTimeout
+from openai import APITimeoutError
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 import os
 
 # config settings
@@ -20,6 +24,52 @@ MODELS = {
     "Google: Gemini 2.5 Pro Experimental": "google/gemini-2.5-pro-exp-03-25"
 }
 
+# evaluations run in background threads, so the page stays responsive and can cancel them
+MAX_EVALUATIONS = int(os.environ.get("MAX_EVALUATIONS", 4))
+# how often the page checks whether the running evaluation is finished
+POLL_INTERVAL = 0.5
+# evaluation is cancelled if no page waited for it for this time in seconds, e.g. the browser tab was closed
+ORPHAN_TIMEOUT = float(os.environ.get("ORPHAN_TIMEOUT", 30))
+
+
+def cancel_orphaned_evaluations(evaluations, lock):
+    """
+    Cancel evaluations that no session waits for, so they don't hold the executor slots
+
+    Parameters
+    ----------
+        evaluations: list
+            submitted evaluations
+        lock: threading.Lock
+            lock guarding the list of evaluations
+    """
+    while True:
+        time.sleep(max(ORPHAN_TIMEOUT / 2, POLL_INTERVAL))
+        with lock:
+            for evaluation in list(evaluations):
+                if evaluation["future"].done():
+                    evaluations.remove(evaluation)
+                elif time.monotonic() - evaluation["heartbeat"] > ORPHAN_TIMEOUT:
+                    evaluation["cancel_event"].set()
+                    evaluation["future"].cancel()
+
+
+@st.cache_resource
+def get_executor():
+    """
+    Create the executor for evaluations and start the watchdog of orphaned evaluations,
+    cached so it's done once per server and not on every import of the module
+    Returns
+    -------
+        tuple[ThreadPoolExecutor, list, threading.Lock]
+            Executor, submitted evaluations and the lock guarding them
+    """
+    executor = ThreadPoolExecutor(max_workers=MAX_EVALUATIONS)
+    evaluations = []
+    lock = threading.Lock()
+    threading.Thread(target=cancel_orphaned_evaluations, args=(evaluations, lock), daemon=True).start()
+    return executor, evaluations, lock
+
 
 def configure_page():
     """
@@ -55,44 +105,108 @@ def upload_tab():
         st.warning("⚠️ Анализ шрифтов поддерживается только в формате pptx ⚠️")
     # stores user's model choice
     selected_model = st.selectbox('Выберите модель:', MODELS.keys())
-    # checks if presentation was uploaded
-    if st.button("Отправить презентацию", disabled=not uploaded_file):
-        try:
-            with st.spinner('Пожалуйста, дождитесь окончания оценивания', show_time=True):
-                response = process_presentation(uploaded_file, selected_model)
-                response_text = response.choices[0].message.content
-                docx_bytes, pdf_bytes = response_handler(response_text)
-                return response_text, docx_bytes, pdf_bytes, uploaded_file.name
-        except Exception as e:
-            st.error(
-                f"""Во время выполнения запроса возникла ошибка.
-                Проверьте правильность загруженного документа или попробуйте воспользоваться другой моделью.
-                \n\nИнформация об ошибке: {e}"""
-            )
+    # checks if presentation was uploaded and no evaluation is running
+    if st.button("Отправить презентацию", disabled=not uploaded_file or st.session_state["evaluation"] is not None):
+        executor, evaluations, lock = get_executor()
+        cancel_event = threading.Event()
+        # session_state isn't available in the background thread, so all params are passed explicitly
+        future = executor.submit(
+            process_presentation,
+            prompt=st.session_state["prompt"],
+            presentation=uploaded_file.getvalue(),
+            file_format=f"{uploaded_file.name.split('.')[-1]}",
+            model=MODELS[selected_model],
+            cancel_event=cancel_event)
+        evaluation = {"future": future, "cancel_event": cancel_event, "name": uploaded_file.name, "heartbeat": time.monotonic()}
+        with lock:
+            evaluations.append(evaluation)
+        st.session_state["evaluation"] = evaluation
+    return wait_evaluation()
+
+
+def wait_evaluation():
+    """
+    Wait for the running evaluation and allow user to cancel it
+    Returns
+    -------
+        tuple[str, bytes, bytes, str]
+            Response text, DOCX bytes, PDF bytes, and file name
+    """
+    evaluation = st.session_state["evaluation"]
+    if evaluation is None:
+        return None, None, None, None
+    if st.button("Отменить оценивание"):
+        evaluation["cancel_event"].set()
+    future = evaluation["future"]
+    with st.spinner('Пожалуйста, дождитесь окончания оценивания', show_time=True):
+        status = st.empty()
+        while not future.done() and not evaluation["cancel_event"].is_set():
+            # every update of the page lets streamlit interrupt this run when the cancel button is clicked
+            status.caption("Оценивание можно отменить кнопкой выше")
+            evaluation["heartbeat"] = time.monotonic()
+            time.sleep(POLL_INTERVAL)
+        status.empty()
+    st.session_state["evaluation"] = None
+    if evaluation["cancel_event"].is_set():
+        # the running stage stops at its next cancellation check, the page doesn't wait for it
+        future.cancel()
+        st.warning("Оценивание отменено")
+        return None, None, None, None
+    try:
+        response_text, docx_bytes, pdf_bytes = future.result()
+        return response_text, docx_bytes, pdf_bytes, evaluation["name"]
+    except ConversionCancelled:
+        st.warning("Оценивание отменено")
+    except ConversionTimeout as e:
+        st.error(
+            f"""Конвертация презентации не завершилась за отведенное время.
+            Возможно, файл слишком большой или сложный. Попробуйте еще раз или упростите презентацию.
+            \n\nИнформация об ошибке: {e}"""
+        )
+    except APITimeoutError as e:
+        st.error(
+            f"""Модель не ответила за отведенное время.
+            Попробуйте еще раз позже или воспользуйтесь другой моделью.
+            \n\nИнформация об ошибке: {e}"""
+        )
+    except Exception as e:
+        st.error(
+            f"""Во время выполнения запроса возникла ошибка.
+            Проверьте правильность загруженного документа или попробуйте воспользоваться другой моделью.
+            \n\nИнформация об ошибке: {e}"""
+        )
     return None, None, None, None
 
 
-def process_presentation(uploaded_file, selected_model):
+def process_presentation(prompt, presentation, file_format, model, cancel_event=None):
     """
-    Send a request to OpenAI
+    Send a request to OpenAI and convert the response to DOCX and PDF
 
     Parameters
     ----------
-        uploaded_file: bytes
+        prompt: str
+            text instructions on how to perform presentation evaluation
+        presentation: bytes
             An array of bytes from presentation uploaded by user
-        selected_model: str
-            Name of a model selected by user or default
+        file_format: str
+            format of the uploaded presentation pdf or pptx
+        model: str
+            Model selected by user or default
+        cancel_event: threading.Event | None
+            event for cancelling the evaluation from another thread
     Returns
     ----------
-        json
-            text information received from LLM
-    """
-    response = send_request(
-        prompt=st.session_state["prompt"],
-        presentation=uploaded_file.getvalue(),
-        file_format=f"{uploaded_file.name.split('.')[-1]}",
-        model=MODELS[selected_model])
-    return response
+        tuple[str, bytes, bytes]
+            Response text, DOCX bytes and PDF bytes
+    """
+    response_text = send_request(
+        prompt=prompt,
+        presentation=presentation,
+        file_format=file_format,
+        model=model,
+        cancel_event=cancel_event)
+    docx_bytes, pdf_bytes = response_handler(response_text, cancel_event)
+    return response_text, docx_bytes, pdf_bytes
 
 
 def show_prompt():
@@ -1,6 +1,6 @@
 import pytest
 from io import BytesIO
-from backend.converter import GenImage
+from backend.converter import GenImage, run_process, ConversionError, ConversionTimeout, ConversionCancelled
 from PIL import Image
 import base64
 from pptx import Presentation
@@ -9,10 +9,15 @@ from pptx.dml.color import RGBColor
 import tempfile
 import os
 import asyncio
+import time
+import threading
 from streamlit.testing.v1 import AppTest
 from backend.llm_call import send_request
 from backend.converter import response_handler
 from pathlib import Path
+from types import SimpleNamespace
+import backend.llm_call as llm_call
+import frontend.interface as interface
 
 
 def create_simple_presentation(output_path):
@@ -105,6 +110,36 @@ def test_fonts_parsing_from_sample_pptx(sample_pptx_bytes):
     assert any("Arial" in font for font in all_fonts if font)
 
 
+def test_pdf_conversion_keeps_slides_order():
+    '''
+    Checking that slides of a long pdf are joined in the right order, page names are zero-padded from 10 pages
+    '''
+    # Every page is filled with its own shade of gray
+    shades = [i * 20 for i in range(12)]
+    pages = [Image.new("RGB", (160, 100), color=(shade, shade, shade)) for shade in shades]
+    buffer = BytesIO()
+    pages[0].save(buffer, "PDF", save_all=True, append_images=pages[1:])
+
+    gi = GenImage(buffer.getvalue(), "pdf")
+    assert gi.img.size == (1440 * len(shades), 900)
+    for i, shade in enumerate(shades):
+        red, _, _ = gi.img.getpixel((1440 * i + 720, 450))
+        assert abs(red - shade) < 8
+
+
+def test_send_request_cancelled(sample_pptx_bytes, monkeypatch):
+    '''
+    Checking that cancelled evaluation doesn't run converters and doesn't call llm
+    '''
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with pytest.raises(ConversionCancelled):
+        send_request(prompt="test", presentation=sample_pptx_bytes, file_format="pptx", cancel_event=cancel_event)
+    with pytest.raises(ConversionCancelled):
+        response_handler("Test message", cancel_event)
+
+
 async def async_convert(sample_pptx_bytes):
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(None, GenImage, sample_pptx_bytes, "pptx")
@@ -117,6 +152,81 @@ async def test_asyncio_parallel(sample_pptx_bytes):
     assert all(len(r.default_fonts) > 0 for r in results)
 
 
+def test_run_process_timeout(tmp_path):
+    '''
+    Checking that a hung converter fails fast and its whole process group is killed
+    '''
+    pid_path = tmp_path / "pid"
+    start = time.monotonic()
+    with pytest.raises(ConversionTimeout):
+        # Orphaned child, like soffice.bin, must be killed together with the leader
+        run_process(["sh", "-c", f"sleep 30 & echo $! > {pid_path}; wait"], timeout=1)
+    assert time.monotonic() - start < 5
+    # Killed child is either reaped already or left as a zombie, SIGKILL delivery may take a moment
+    stat_path = Path(f"/proc/{pid_path.read_text().strip()}/stat")
+    for _ in range(10):
+        if not stat_path.exists() or stat_path.read_text().split()[2] == "Z":
+            break
+        time.sleep(0.1)
+    else:
+        pytest.fail("Child process of the converter is still running")
+
+
+def test_run_process_cancel():
+    '''
+    Checking that a running converter can be cancelled from another thread
+    '''
+    cancel_event = threading.Event()
+    threading.Timer(0.5, cancel_event.set).start()
+    start = time.monotonic()
+    with pytest.raises(ConversionCancelled):
+        run_process(["sleep", "30"], timeout=60, cancel_event=cancel_event)
+    assert time.monotonic() - start < 5
+    # Already cancelled evaluation doesn't start new converters
+    with pytest.raises(ConversionCancelled):
+        run_process(["sleep", "30"], timeout=60, cancel_event=cancel_event)
+
+
+def test_run_process_not_installed():
+    '''
+    Checking that a missing converter is reported clearly
+    '''
+    with pytest.raises(ConversionError) as exc:
+        run_process(["no-such-converter", "--version"], timeout=5)
+    assert "no-such-converter is not installed" in str(exc.value)
+
+
+def test_send_request_cancelled_while_streaming(monkeypatch):
+    '''
+    Checking that llm answer stops streaming when the evaluation is cancelled
+    '''
+    cancel_event = threading.Event()
+
+    class FakeStream:
+        closed = False
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.closed = True
+
+        def __iter__(self):
+            for text in ["first", "second", "third"]:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+                # User cancels the evaluation after the first chunk
+                cancel_event.set()
+
+    stream = FakeStream()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: stream)))
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(llm_call, "OpenAI", lambda **kwargs: client)
+    monkeypatch.setattr(llm_call, "convert_to_img", lambda *args: SimpleNamespace(base64=lambda: b"", fonts={}))
+    with pytest.raises(ConversionCancelled):
+        send_request(prompt="test", presentation=b"", file_format="pptx", cancel_event=cancel_event)
+    assert stream.closed
+
+
 def test_show_prompt(run_app):
     """
     Checks if default prompt shown correctly
@@ -141,12 +251,42 @@ def test_save_prompt(run_app):
     assert "Добавьте текст запроса, поле не может быть пустым" in run_app.error.values[0]
 
 
+def test_cancel_evaluation(run_app, monkeypatch):
+    """
+    Checks if the page stops waiting as soon as the evaluation is cancelled,
+    and the evaluation itself stops at its next cancellation check
+    """
+    def slow_send_request(cancel_event, **kwargs):
+        # Like streamed llm answer, stops when the cancel event is checked
+        cancel_event.wait(30)
+        raise ConversionCancelled("Evaluation was cancelled while waiting for the answer")
+
+    monkeypatch.setattr(interface, "send_request", slow_send_request)
+    cancel_event = threading.Event()
+    executor, _, _ = interface.get_executor()
+    future = executor.submit(
+        interface.process_presentation, prompt="test", presentation=b"", file_format="pptx", model="test",
+        cancel_event=cancel_event)
+    run_app.session_state["evaluation"] = {
+        "future": future, "cancel_event": cancel_event, "name": "test.pptx", "heartbeat": time.monotonic()
+    }
+    # Cancel is requested while the page waits for the evaluation
+    threading.Timer(1, cancel_event.set).start()
+    start = time.monotonic()
+    run_app.run()
+    assert time.monotonic() - start < 10
+    assert run_app.session_state["evaluation"] is None
+    assert "Оценивание отменено" in run_app.warning.values
+    # The worker is freed too
+    assert isinstance(future.exception(timeout=5), ConversionCancelled)
+
+
 def test_send_request(sample_pptx_bytes):
     """
     Send a request to llm and anticipate correct response
     """
     prompt = "В ответном сообщении отправь только текст с первого слайда через запятую и больше ничего!"
-    response = send_request(prompt=prompt, presentation=sample_pptx_bytes, file_format="pptx").choices[0].message.content
+    response = send_request(prompt=prompt, presentation=sample_pptx_bytes, file_format="pptx")
     phrase_1 = "Тестовая презентация"
     phrase_2 = "Создано для теста GenImage"
     flag = "False"